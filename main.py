@@ -1,26 +1,28 @@
 import os
+import asyncio
 import sys
 import logging
 import zipfile
-import pandas as pd
-import requests
+import csv
+import re
+import hashlib
+import shutil
+import threading
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi import APIRouter, FastAPI, File, UploadFile, Form, HTTPException, Request
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import google.generativeai as genai
 import tempfile
 import json
 import datetime
-from collections import Counter
-from fastapi.templating import Jinja2Templates
+from collections import Counter, OrderedDict, deque
+from itertools import islice
+from pathlib import Path
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from functools import lru_cache
 import time
 
-# Initialize Jinja2 templates
-templates = Jinja2Templates(directory="templates")
-
 # Configure logging for Vercel deployment
 logging.basicConfig(
     level=logging.INFO,
@@ -31,25 +33,14 @@ logging.basicConfig(
 # Load environment variables
 load_dotenv()
 
-# Initialize FastAPI 
-app = FastAPI(
-    title="IIT Madras Assignment Helper",
-    description="API that helps answer IIT Madras Data Science graded assignment questions",
-    version="1.0.0"
-)
+# Routes are registered on a router so every entrypoint shares one set of
+# handlers, model and question history
+router = APIRouter()
 
-# Add CORS middleware for frontend access
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, replace with specific origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Set up templates and static files with proper directory paths
-templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
-static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+# Set up templates and static files with proper directory paths - resolved once
+BASE_DIR = Path(__file__).resolve().parent
+templates_dir = str(BASE_DIR / "templates")
+static_dir = str(BASE_DIR / "static")
 
 # Handle the case where static might exist as a file
 try:
@@ -66,10 +57,6 @@ try:
 except Exception as e:
     logging.error(f"Error creating directories: {str(e)}")
 
-# Initialize templates and mount static files (only once!)
-templates = Jinja2Templates(directory=templates_dir)
-app.mount("/static", StaticFiles(directory=static_dir, check_dir=False), name="static")
-
 # Log directory information
 logging.info(f"Templates directory: {templates_dir}")
 logging.info(f"Static directory: {static_dir}")
@@ -80,17 +67,93 @@ if not GEMINI_API_KEY:
     logging.error("GEMINI_API_KEY not found in environment variables")
     # Don't raise an error here - simply log it and let the endpoints fail gracefully
 
-# Configure Gemini
-genai.configure(api_key=GEMINI_API_KEY)
+# Heavy modules (Gemini SDK, Jinja2, numpy) are imported on first use so
+# serverless cold starts can serve requests sooner
+@lru_cache(maxsize=1)
+def get_genai():
+    """Import and configure the Gemini SDK"""
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai
+
+@lru_cache(maxsize=1)
+def get_templates():
+    """Create the Jinja2 templates environment"""
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory=templates_dir)
 
-# Global variable for the model and question history
+# Global variable for the model and question history - the deque drops the
+# oldest entry itself, and question frequency and the dashboard's top
+# questions are kept up to date as answers are recorded
+QUESTION_HISTORY_SIZE = 100
 gemini_model = None
-question_history = []
+model_lock = threading.Lock()
+
+# Model initialization status - after a failed attempt no probing happens
+# until the backoff elapses, and / reports the instance as unavailable
+MODEL_RETRY_BACKOFF = 60
+model_retry_at = 0.0
+model_checked = False
+question_history = deque(maxlen=QUESTION_HISTORY_SIZE)
+question_counter = Counter()
+most_frequent_questions = []
+history_lock = threading.Lock()
+
+# The dashboard is re-rendered only when the history version changes; the
+# boot id keeps ETags from an earlier process from matching this one
+history_version = 0
+BOOT_ID = f"{time.time_ns():x}"
+
+# Model name resolution - GEMINI_MODEL_NAME skips probing entirely, and a
+# probed name is saved so later cold starts can reuse it until Gemini stops
+# accepting it
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME")
+MODEL_NAME_CACHE_PATH = os.path.join(tempfile.gettempdir(), "yantravid_gemini_model.txt")
+
+def read_saved_model_name():
+    """Return the model name saved by an earlier cold start, if any"""
+    try:
+        with open(MODEL_NAME_CACHE_PATH) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def save_model_name(name):
+    """Persist the working model name for later cold starts"""
+    try:
+        with open(MODEL_NAME_CACHE_PATH, "w") as f:
+            f.write(name)
+    except OSError as e:
+        logging.warning(f"Could not save model name: {str(e)}")
+
+def discard_model_if_unavailable(error):
+    """Forget the model and its saved name when Gemini no longer serves it"""
+    global gemini_model
+    from google.api_core import exceptions as google_exceptions
+    if not isinstance(error, (google_exceptions.NotFound, google_exceptions.PermissionDenied)):
+        return
+
+    logging.warning(f"Model no longer available, probing again: {str(error)}")
+    with model_lock:
+        gemini_model = None
+        get_cached_model_name.cache_clear()
+        try:
+            os.remove(MODEL_NAME_CACHE_PATH)
+        except OSError:
+            pass
 
 # Cached function to get or initialize the model - improves performance
 @lru_cache(maxsize=1)
 def get_cached_model_name():
     """Return the first working model name"""
+    if GEMINI_MODEL_NAME:
+        return GEMINI_MODEL_NAME
+
+    saved_name = read_saved_model_name()
+    if saved_name:
+        logging.info(f"Using saved model: {saved_name}")
+        return saved_name
+
     model_names = [
         "models/gemini-1.5-flash",
         "gemini-1.5-flash", 
@@ -98,14 +161,14 @@ def get_cached_model_name():
         "gemini-1.5-pro"
     ]
     
+    genai = get_genai()
     for name in model_names:
         try:
-            model = genai.GenerativeModel(name)
-            # Simple test
-            test = model.generate_content("Test")
-            if test and hasattr(test, "text"):
-                logging.info(f"Found working model: {name}")
-                return name
+            # Metadata lookup only - no tokens are spent on a test prompt
+            genai.get_model(name)
+            logging.info(f"Found working model: {name}")
+            save_model_name(name)
+            return name
         except Exception as e:
             logging.warning(f"Model {name} failed: {str(e)}")
             continue
@@ -114,33 +177,291 @@ def get_cached_model_name():
 
 # Function to get model - uses cached result
 def get_model():
-    global gemini_model
+    global gemini_model, model_retry_at
     if gemini_model is not None:
         return gemini_model
-        
-    start_time = time.time()
-    model_name = get_cached_model_name()
-    
-    if not model_name:
-        logging.error("No working models found")
+
+    # Without a key every probe would fail - don't make any
+    if not GEMINI_API_KEY or time.time() < model_retry_at:
         return None
-        
+
+    # Requests served from worker threads must not build a second model
+    with model_lock:
+        if gemini_model is not None:
+            return gemini_model
+        # Callers queued on the lock behind a failed attempt wait out its backoff
+        if time.time() < model_retry_at:
+            return None
+
+        start_time = time.time()
+        model_name = get_cached_model_name()
+
+        if not model_name:
+            logging.error("No working models found")
+            get_cached_model_name.cache_clear()
+            model_retry_at = time.time() + MODEL_RETRY_BACKOFF
+            return None
+
+        try:
+            gemini_model = get_genai().GenerativeModel(model_name)
+            logging.info(f"Model initialized in {time.time() - start_time:.2f}s")
+            return gemini_model
+        except Exception as e:
+            logging.error(f"Error initializing model: {str(e)}")
+            model_retry_at = time.time() + MODEL_RETRY_BACKOFF
+            return None
+
+# Static preamble sent with every question. Gemini context caching is not
+# used for it: the installed SDK has no caching API, and the service only
+# caches prefixes many thousands of tokens long, far above this sentence.
+ASSIGNMENT_CONTEXT = "You are helping with IIT Madras Online Degree in Data Science assignments."
+
+# Answer cache settings - identical prompts skip Gemini entirely, and the
+# optional semantic tier reuses answers for near-identical questions
+ANSWER_CACHE_SIZE = 512
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_MODEL = "models/text-embedding-004"
+SEMANTIC_CACHE_THRESHOLD = 0.93
+SEMANTIC_CACHE_MAX_ROWS = 1000
+
+class SemanticCache:
+    """Fixed-size matrix of normalized question embeddings and their answers"""
+
+    def __init__(self, max_rows=SEMANTIC_CACHE_MAX_ROWS, threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.max_rows = max_rows
+        self.threshold = threshold
+        self.matrix = None
+        self.answers = [None] * max_rows
+        self.size = 0
+        self.next_row = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, vec):
+        """Return the cached answer closest to vec, if it clears the threshold"""
+        import numpy as np
+        with self.lock:
+            if self.size == 0 or vec.shape[0] != self.matrix.shape[1]:
+                return None
+            scores = self.matrix[:self.size] @ vec
+            best = int(np.argmax(scores))
+            if scores[best] > self.threshold:
+                return self.answers[best]
+        return None
+
+    def add(self, vec, answer):
+        """Store an answer, overwriting the oldest row once the cache is full"""
+        import numpy as np
+        with self.lock:
+            if self.matrix is None or vec.shape[0] != self.matrix.shape[1]:
+                self.matrix = np.zeros((self.max_rows, vec.shape[0]), dtype=np.float32)
+                self.size = 0
+                self.next_row = 0
+            self.matrix[self.next_row] = vec
+            self.answers[self.next_row] = answer
+            self.next_row = (self.next_row + 1) % self.max_rows
+            self.size = min(self.size + 1, self.max_rows)
+
+semantic_cache = SemanticCache()
+
+def embed_question(question):
+    """Return the normalized embedding of a question, or None if embedding fails"""
+    import numpy as np
     try:
-        gemini_model = genai.GenerativeModel(model_name)
-        logging.info(f"Model initialized in {time.time() - start_time:.2f}s")
-        return gemini_model
+        result = get_genai().embed_content(model=SEMANTIC_CACHE_MODEL, content=question)
+        vec = np.asarray(result["embedding"], dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else None
     except Exception as e:
-        logging.error(f"Error initializing model: {str(e)}")
+        logging.warning(f"Question embedding failed: {str(e)}")
         return None
 
+# Exact-match answer cache, keyed by prompt - checked before the semantic
+# tier so repeated questions never pay for an embedding call
+answer_cache = OrderedDict()
+answer_cache_lock = threading.Lock()
+
+def get_cached_answer(prompt):
+    """Return the cached answer for a prompt, or None"""
+    with answer_cache_lock:
+        answer = answer_cache.get(prompt)
+        if answer is not None:
+            answer_cache.move_to_end(prompt)
+        return answer
+
+def generate_answer(prompt):
+    """Generate and clean up the Gemini answer for a prompt"""
+    answer = get_cached_answer(prompt)
+    if answer is not None:
+        return answer
+
+    try:
+        response = get_model().generate_content(prompt)
+    except Exception as e:
+        discard_model_if_unavailable(e)
+        raise
+
+    if not hasattr(response, "text"):
+        raise ValueError("Unexpected response format from Gemini API")
+
+    answer = clean_answer(response.text)
+    with answer_cache_lock:
+        answer_cache[prompt] = answer
+        if len(answer_cache) > ANSWER_CACHE_SIZE:
+            answer_cache.popitem(last=False)
+    return answer
+
+# Prompt pieces and cleanup pattern are built once at import
+PROMPT_PREFIX = f"{ASSIGNMENT_CONTEXT}\n\nQuestion: "
+PROMPT_SUFFIX = (
+    "\n\nAnswer only with the exact answer that should be entered into the assignment form. "
+    "Do not include explanations or anything else. Just the direct answer."
+)
+QUOTES_RE = re.compile(r"[\"']")
+
+# Gemini calls in flight, keyed by prompt - concurrent requests for the same
+# prompt wait on one call instead of each paying for their own
+inflight_answers = {}
+
+async def generate_answer_once(prompt):
+    """Generate an answer, sharing the Gemini call with identical concurrent requests"""
+    task = inflight_answers.get(prompt)
+    if task is None:
+        task = asyncio.ensure_future(run_in_threadpool(generate_answer, prompt))
+        inflight_answers[prompt] = task
+        task.add_done_callback(lambda _: inflight_answers.pop(prompt, None))
+    # A cancelled request must not cancel the call other requests are waiting on
+    return await asyncio.shield(task)
+
+def build_prompt(question):
+    """Format prompt for better results"""
+    return PROMPT_PREFIX + question + PROMPT_SUFFIX
+
+def clean_answer(text):
+    """Strip quotes, whitespace and markdown fences from a Gemini answer"""
+    # Clean up the answer - remove quotation marks, leading/trailing spaces
+    answer = QUOTES_RE.sub("", text.strip())
+
+    # Remove any markdown formatting if present
+    if answer.startswith("```") and answer.endswith("```"):
+        answer = answer[3:-3].strip()
+
+    return answer
+
+def record_answer(question, answer, had_file, question_vec=None):
+    """Add an answer to the question history and the semantic cache"""
+    global most_frequent_questions, history_version
+    with history_lock:
+        # Forget the entry the deque is about to evict
+        if len(question_history) == question_history.maxlen:
+            evicted = question_history[0]["question"]
+            question_counter[evicted] -= 1
+            if question_counter[evicted] <= 0:
+                del question_counter[evicted]
+
+        question_history.append({
+            "question": question,
+            "answer": answer,
+            "timestamp": datetime.datetime.now(),
+            "had_file": had_file
+        })
+        question_counter[question] += 1
+        most_frequent_questions = question_counter.most_common(5)
+        history_version += 1
+
+    if question_vec is not None:
+        semantic_cache.add(question_vec, answer)
+
+# Uploads are copied to disk in fixed-size chunks so memory use does not
+# grow with the file size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def save_upload(file, file_path):
+    """Copy an uploaded file to disk chunk by chunk and return its SHA-256 digest"""
+    digest = hashlib.sha256()
+    with open(file_path, "wb") as f:
+        while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+            f.write(chunk)
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def extract_zip(file_path, extract_dir):
+    """Open a ZIP and extract it - both read the archive from disk"""
+    os.makedirs(extract_dir, exist_ok=True)
+    with zipfile.ZipFile(file_path, "r") as zip_ref:
+        zip_ref.extractall(extract_dir)
+
+# Answers found in uploaded ZIPs, keyed by the ZIP's SHA-256 digest - an
+# identical upload skips extraction and the CSV search
+ZIP_ANSWER_CACHE_SIZE = 512
+zip_answer_cache = OrderedDict()
+
+def cache_zip_answer(digest, answer):
+    """Remember the answer (or None) found in a ZIP, dropping the oldest entry when full"""
+    zip_answer_cache[digest] = answer
+    zip_answer_cache.move_to_end(digest)
+    if len(zip_answer_cache) > ZIP_ANSWER_CACHE_SIZE:
+        zip_answer_cache.popitem(last=False)
+
+def read_answer_from_csv(csv_path):
+    """Return the first value of the "answer" column, reading only the header and one row"""
+    with open(csv_path, newline="", encoding="utf-8-sig") as fh:
+        reader = csv.reader(fh)
+        header = next(reader, None)
+        if not header or "answer" not in header:
+            return None
+        row = next(reader, None)
+        if row is None:
+            return None
+        idx = header.index("answer")
+        return row[idx] if idx < len(row) else None
+
+# CSVs are read in worker threads, a few at a time to suit small serverless CPUs
+CSV_READ_CONCURRENCY = 4
+
+async def find_answer_in_dir(extract_dir):
+    """Return the answer from the first CSV (in search order) that has one"""
+    # rglob is lazy, so the search stops with the first batch that has an answer
+    csv_paths = (p for p in Path(extract_dir).rglob("*.csv") if p.is_file())
+    while batch := list(islice(csv_paths, CSV_READ_CONCURRENCY)):
+        results = await asyncio.gather(
+            *(run_in_threadpool(read_answer_from_csv, p) for p in batch)
+        )
+        answer = next((r for r in results if r is not None), None)
+        if answer is not None:
+            return answer
+    return None
+
+# Blocking work (Gemini calls, unzip, CSV reads) runs in the anyio threadpool;
+# raise its default limit of 40 threads so concurrent uploads are not queued
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "64"))
+
+@router.on_event("startup")
+async def configure_threadpool():
+    """Size the worker thread pool used for blocking Gemini and file calls"""
+    import anyio.to_thread
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+@router.on_event("startup")
+async def initialize_model():
+    """Initialize the model once at startup so / can report readiness"""
+    global model_checked
+    if await run_in_threadpool(get_model) is None:
+        logging.error("AI model unavailable at startup")
+    model_checked = True
+
 # Health check route
-@app.get("/")
+@router.get("/")
 # Replace the root route with a simpler one
 
-@app.get("/")
+@router.get("/")
 async def root(request: Request):
-    """Root route that always shows the dashboard"""
+    """Root route that shows the dashboard, or 503 when the model is unavailable"""
     logging.info("Root route accessed")
+    if model_checked and gemini_model is None:
+        return ORJSONResponse(
+            content={"status": "unavailable", "error": "Could not initialize AI model"},
+            status_code=503
+        )
     return await dashboard(request)
 # async def root(request: Request):
 #     """Redirect to dashboard or show simple health check"""
@@ -155,21 +476,21 @@ async def root(request: Request):
 #     }
 # Add these debug endpoints
 
-@app.get("/debug")
+@router.get("/debug")
 async def debug_info():
     """Debug endpoint to check environment"""
     return {
         "api_key_exists": bool(GEMINI_API_KEY),
         "question_history": len(question_history),
         "model_initialized": gemini_model is not None,
-        "templates_dir_exists": os.path.isdir("templates"),
-        "static_dir_exists": os.path.isdir("static")
+        "templates_dir_exists": os.path.isdir(templates_dir),
+        "static_dir_exists": os.path.isdir(static_dir)
     }
 
-@app.get("/debug/template")
+@router.get("/debug/template")
 async def debug_template(request: Request):
     """Test template rendering with minimal data"""
-    return templates.TemplateResponse(
+    return get_templates().TemplateResponse(
         "dashboard.html",
         {
             "request": request,
@@ -178,8 +499,8 @@ async def debug_template(request: Request):
         }
     )
 # Testing route
-@app.get("/test")
-async def test():
+@router.get("/test")
+def test():
     """Test endpoint to verify the AI model is working"""
     try:
         start_time = time.time()
@@ -199,10 +520,11 @@ async def test():
         }
     except Exception as e:
         logging.error(f"Test endpoint error: {str(e)}")
+        discard_model_if_unavailable(e)
         return {"error": str(e)}
 
 # Main API endpoint
-@app.post("/api/")
+@router.post("/api/")
 async def get_answer(question: str = Form(...), file: UploadFile = None):
     """
     Main API endpoint that accepts a question and optional file
@@ -212,13 +534,13 @@ async def get_answer(question: str = Form(...), file: UploadFile = None):
     try:
         logging.info(f"Received question: {question}")
         
-        # Get the model
-        model = get_model()
+        # Get the model - blocking SDK calls run in the threadpool
+        model = await run_in_threadpool(get_model)
         model_time = time.time()
         logging.info(f"Model initialization took: {model_time - start_time:.2f}s")
         
         if not model:
-            return JSONResponse(
+            return ORJSONResponse(
                 content={"error": "Could not initialize AI model"},
                 status_code=500
             )
@@ -227,127 +549,192 @@ async def get_answer(question: str = Form(...), file: UploadFile = None):
         answer = None
         if file and file.filename:
             file_start = time.time()
-            with tempfile.TemporaryDirectory() as temp_dir:
+            # Removing the directory tree blocks, so cleanup runs in the threadpool
+            temp_dir = tempfile.mkdtemp()
+            try:
                 file_path = os.path.join(temp_dir, file.filename)
                 
                 # Save uploaded file
-                with open(file_path, "wb") as f:
-                    contents = await file.read()
-                    f.write(contents)
+                digest = await run_in_threadpool(save_upload, file, file_path)
                 
                 # Process ZIP files - common in assignments
-                if file.filename.endswith('.zip'):
+                if file.filename.endswith('.zip') and digest in zip_answer_cache:
+                    answer = zip_answer_cache[digest]
+                    zip_answer_cache.move_to_end(digest)
+                    logging.info(f"Using cached answer for ZIP {digest[:12]}: {answer}")
+                elif file.filename.endswith('.zip'):
                     extract_dir = os.path.join(temp_dir, "extracted")
-                    os.makedirs(extract_dir, exist_ok=True)
                     
-                    with zipfile.ZipFile(file_path, "r") as zip_ref:
-                        zip_ref.extractall(extract_dir)
+                    # Extract in a worker thread so the event loop stays responsive
+                    await run_in_threadpool(extract_zip, file_path, extract_dir)
                     
                     # Look for CSV files with "answer" column
-                    for root, _, files in os.walk(extract_dir):
-                        for f in files:
-                            if f.endswith('.csv'):
-                                csv_path = os.path.join(root, f)
-                                df = pd.read_csv(csv_path)
-                                
-                                if "answer" in df.columns:
-                                    answer = str(df["answer"].iloc[0])
-                                    logging.info(f"Found answer in CSV: {answer}")
-                                    logging.info(f"File processing took: {time.time() - file_start:.2f}s")
-                                    break
+                    answer = await find_answer_in_dir(extract_dir)
+                    cache_zip_answer(digest, answer)
+                    if answer is not None:
+                        logging.info(f"Found answer in CSV: {answer}")
+                        logging.info(f"File processing took: {time.time() - file_start:.2f}s")
+            finally:
+                await run_in_threadpool(shutil.rmtree, temp_dir, True)
             
             if answer:
                 # Record the question and answer
-                question_history.append({
-                    "question": question,
-                    "answer": answer,
-                    "timestamp": datetime.datetime.now(),
-                    "had_file": True
-                })
-                
-                # Limit history size to prevent memory issues
-                if len(question_history) > 100:
-                    question_history.pop(0)
-                    
+                record_answer(question, answer, had_file=True)
+
                 logging.info(f"Total request time: {time.time() - start_time:.2f}s")
-                return JSONResponse(content={"answer": answer})
+                return ORJSONResponse(content={"answer": answer})
         
         # If no answer found in file, use Gemini AI
         logging.info(f"Generating answer with Gemini AI")
         ai_start = time.time()
         
-        # Format prompt for better results
-        prompt = (
-            f"You are helping with IIT Madras Online Degree in Data Science assignments.\n\n"
-            f"Question: {question}\n\n"
-            f"Answer only with the exact answer that should be entered into the assignment form. "
-            f"Do not include explanations or anything else. Just the direct answer."
-        )
-        
-        response = model.generate_content(prompt)
-        
-        if hasattr(response, "text"):
-            # Clean up the answer - remove quotation marks, leading/trailing spaces
-            answer = response.text.strip()
-            answer = answer.replace('"', '').replace("'", "")
-            
-            # Remove any markdown formatting if present
-            if answer.startswith("```") and answer.endswith("```"):
-                answer = answer[3:-3].strip()
-                
-            logging.info(f"Gemini generated answer: {answer}")
-            logging.info(f"AI generation took: {time.time() - ai_start:.2f}s")
+        prompt = build_prompt(question)
+
+        # Exact repeats are answered from memory; only a miss is embedded so
+        # near-identical questions can reuse an earlier answer
+        question_vec = None
+        answer = get_cached_answer(prompt)
+        if answer is not None:
+            logging.info(f"Answer cache hit: {answer}")
+        elif SEMANTIC_CACHE_ENABLED:
+            question_vec = await run_in_threadpool(embed_question, question)
+            answer = semantic_cache.lookup(question_vec) if question_vec is not None else None
+            if answer is not None:
+                logging.info(f"Semantic cache hit: {answer}")
+                question_vec = None
 
-            # Record the question and answer
-            question_history.append({
-                "question": question,
-                "answer": answer,
-                "timestamp": datetime.datetime.now(),
-                "had_file": file is not None
-            })
+        if answer is None:
+            answer = await generate_answer_once(prompt)
+            logging.info(f"Gemini generated answer: {answer}")
+        logging.info(f"AI generation took: {time.time() - ai_start:.2f}s")
 
-            # Limit history size to prevent memory issues
-            if len(question_history) > 100:
-                question_history.pop(0)
+        # Record the question and answer
+        record_answer(question, answer, had_file=file is not None, question_vec=question_vec)
 
-            logging.info(f"Total request time: {time.time() - start_time:.2f}s")
-            return JSONResponse(content={"answer": answer})
-        else:
-            raise ValueError("Unexpected response format from Gemini API")
+        logging.info(f"Total request time: {time.time() - start_time:.2f}s")
+        return ORJSONResponse(content={"answer": answer})
 
     except Exception as e:
         error_msg = str(e)
         logging.error(f"Error processing request: {error_msg}")
         logging.info(f"Failed request total time: {time.time() - start_time:.2f}s")
-        return JSONResponse(
+        return ORJSONResponse(
+            content={"error": error_msg},
+            status_code=500
+        )
+
+# Appended to a streamed answer that fails after the response has started
+STREAM_ERROR_MARKER = "\n[error] "
+
+# Streaming API endpoint
+@router.post("/api/stream")
+async def stream_answer(question: str = Form(...)):
+    """
+    Streaming variant of /api/ for questions answered by Gemini. The raw
+    model output is sent as plain text while it is being generated
+    """
+    logging.info(f"Received streaming question: {question}")
+    model = await run_in_threadpool(get_model)
+    if not model:
+        return ORJSONResponse(
+            content={"error": "Could not initialize AI model"},
+            status_code=500
+        )
+
+    prompt = build_prompt(question)
+    start_time = time.time()
+
+    # Pull the first chunk before responding so a failed call still gets a 500
+    def start_stream():
+        chunks = iter(model.generate_content(prompt, stream=True))
+        first = next(chunks, None)
+        return chunks, first.text if first is not None else ""
+
+    try:
+        chunks, first_text = await run_in_threadpool(start_stream)
+    except Exception as e:
+        error_msg = str(e)
+        logging.error(f"Error starting answer stream: {error_msg}")
+        discard_model_if_unavailable(e)
+        return ORJSONResponse(
             content={"error": error_msg},
             status_code=500
         )
 
+    # Sync generator - starlette iterates it in a worker thread
+    def generate():
+        parts = [first_text]
+        yield first_text
+        try:
+            for chunk in chunks:
+                parts.append(chunk.text)
+                yield chunk.text
+        except Exception as e:
+            # Headers are already sent - end the body with a visible marker
+            logging.error(f"Error streaming answer: {str(e)}")
+            yield f"{STREAM_ERROR_MARKER}{str(e)}"
+            return
+
+        # Clean up only the complete answer before recording it
+        answer = clean_answer("".join(parts))
+        record_answer(question, answer, had_file=False)
+        logging.info(f"Streamed answer in {time.time() - start_time:.2f}s")
+
+    return StreamingResponse(generate(), media_type="text/plain")
+
+@lru_cache(maxsize=1)
+def render_dashboard(version):
+    """Render the dashboard HTML for a given history version"""
+    with history_lock:
+        # Get the most frequent questions - refreshed whenever an answer is recorded
+        most_frequent = most_frequent_questions
+
+        # Get the most recent questions - the history is already in insertion order
+        recent_questions = list(islice(reversed(question_history), 10))
+
+    return get_templates().get_template("dashboard.html").render(
+        most_frequent=most_frequent,
+        recent_questions=recent_questions
+    )
+
 # Dashboard route
-@app.get("/dashboard")
+@router.get("/dashboard")
 async def dashboard(request: Request):
     """Dashboard showing past questions and a form to ask new ones"""
     start_time = time.time()
-    
-    # Get the most frequent questions
-    question_counts = Counter([q["question"] for q in question_history])
-    most_frequent = question_counts.most_common(5)
-    
-    # Get the most recent questions
-    recent_questions = sorted(
-        question_history, 
-        key=lambda x: x["timestamp"], 
-        reverse=True
-    )[:10]
-    
+    version = history_version
+    headers = {"ETag": f'"{BOOT_ID}-{version}"', "Cache-Control": "no-cache"}
+
+    # Nothing was asked since the client's copy was rendered
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    html = render_dashboard(version)
     logging.info(f"Dashboard rendered in {time.time() - start_time:.2f}s")
-    
-    return templates.TemplateResponse(
-        "dashboard.html",
-        {
-            "request": request,
-            "most_frequent": most_frequent,
-            "recent_questions": recent_questions
-        }
+
+    return HTMLResponse(html, headers=headers)
+
+def create_app():
+    """Build the FastAPI application used by every entrypoint"""
+    app = FastAPI(
+        title="IIT Madras Assignment Helper",
+        description="API that helps answer IIT Madras Data Science graded assignment questions",
+        version="1.0.0",
+        default_response_class=ORJSONResponse
     )
+
+    # Add CORS middleware for frontend access
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # In production, replace with specific origins
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Mount static files (only once!) - templates are loaded on first render
+    app.mount("/static", StaticFiles(directory=static_dir, check_dir=False), name="static")
+    app.include_router(router)
+    return app
+
+app = create_app()
@@ -1,163 +1,457 @@
+import io
 import os
 import sys
-import unittest
-import json
-from fastapi.testclient import TestClient
-from datetime import datetime
-import tempfile
+import asyncio
+import time
+import pytest
+import httpx
 import zipfile
-import csv
-import pandas as pd
-from unittest.mock import patch, MagicMock
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch, create_autospec
+
+# Import your FastAPI app - main.py lives one level above tests/
+HERE = Path(__file__).resolve().parent
+sys.path.append(str(HERE.parent))
+import main
+from main import app, get_model, SemanticCache, read_answer_from_csv
+
+# Assignment ZIP for the upload test, built once in memory
+_ZIP_BYTES = io.BytesIO()
+with zipfile.ZipFile(_ZIP_BYTES, 'w') as z:
+    z.writestr(
+        zipfile.ZipInfo("answers.csv"),
+        b"answer,other_column\n42,some data\n",
+        compress_type=zipfile.ZIP_STORED
+    )
+_ZIP_BYTES_RAW = _ZIP_BYTES.getvalue()
+
+
+# Model responses built once and shared - the app only reads .text
+_RESP_FOUR = SimpleNamespace(text="4")
+_RESP_PARIS = SimpleNamespace(text="Paris")
+_RESP_BERLIN = SimpleNamespace(text="Berlin")
+_RESP_MADRID = SimpleNamespace(text="Madrid")
+_STREAM_CHUNKS = (SimpleNamespace(text="Ro"), SimpleNamespace(text="me"))
+
+# Minimal dashboard used when the real template is missing from a checkout
+_FALLBACK_DASHBOARD = b"""<!DOCTYPE html>
+<html>
+<head><title>Dashboard</title></head>
+<body>
+    <h1>Dashboard</h1>
+    <ul>
+    {% for item in recent_questions %}
+        <li>{{ item.question }} - {{ item.answer }}</li>
+    {% endfor %}
+    </ul>
+</body>
+</html>"""
+
+
+@pytest.fixture(scope="session")
+def dashboard_template(tmp_path_factory):
+    """Make sure the dashboard template exists, once per session"""
+    template = Path(main.templates_dir) / "dashboard.html"
+    if template.exists():
+        yield template
+        return
+    
+    # Render from a temporary directory rather than writing into the checkout
+    template = tmp_path_factory.mktemp("templates") / "dashboard.html"
+    template.write_bytes(_FALLBACK_DASHBOARD)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(main, "templates_dir", str(template.parent))
+        main.get_templates.cache_clear()
+        main.render_dashboard.cache_clear()
+        try:
+            yield template
+        finally:
+            main.get_templates.cache_clear()
+            main.render_dashboard.cache_clear()
+
+
+@pytest.fixture(scope="session")
+def model_template():
+    """Autospec'd model built once - create_autospec walks the whole class"""
+    # Imported here so collecting the tests does not pay for the SDK import
+    from google.generativeai import GenerativeModel
+    return create_autospec(GenerativeModel, instance=True)
 
-# Import your FastAPI app
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from main import app, get_model
 
-# Create a test client
-client = TestClient(app)
+@pytest.fixture(scope="session")
+async def client(model_template):
+    """One async client for the whole session - startup hooks run only once"""
+    # Stand-in model so startup and every test never reach Gemini
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(main, "get_model", lambda: model_template)
+        mp.setattr(main, "gemini_model", model_template)
+        # ASGITransport skips lifespan events, so run startup/shutdown here
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+                yield c
 
-class TestAssignmentHelper(unittest.TestCase):
+
+@pytest.fixture
+def model(client, model_template):
+    """The session model with calls and configured responses cleared"""
+    model_template.reset_mock(return_value=True, side_effect=True)
+    return model_template
+
+
+async def test_smoke_routes_concurrent(client, dashboard_template):
+    """Test the read-only routes, requested concurrently over one client"""
+    root, debug, dashboard = await asyncio.gather(
+        client.get("/"),
+        client.get("/debug"),
+        client.get("/dashboard")
+    )
     
-    def test_root_route(self):
-        """Test that the root route returns a 200 response"""
-        response = client.get("/")
-        self.assertEqual(response.status_code, 200)
+    assert root.status_code == 200
+    assert dashboard.status_code == 200
     
-    def test_debug_endpoint(self):
-        """Test that the debug endpoint returns expected information"""
-        response = client.get("/debug")
-        data = response.json()
-        
-        # Check that the response contains expected keys
-        self.assertIn("api_key_exists", data)
-        self.assertIn("question_history", data)
-        self.assertIn("model_initialized", data)
-        self.assertIn("templates_dir_exists", data)
-        self.assertIn("static_dir_exists", data)
-    
-    @patch("main.get_model")
-    def test_test_endpoint(self, mock_get_model):
-        """Test the /test endpoint with a mocked model"""
-        # Create a mock model response
-        mock_model = MagicMock()
-        mock_response = MagicMock()
-        mock_response.text = "4"
-        mock_model.generate_content.return_value = mock_response
-        
-        # Set up the mock to return our mock model
-        mock_get_model.return_value = mock_model
-        
-        response = client.get("/test")
-        data = response.json()
+    # Check that the debug response contains expected keys
+    data = debug.json()
+    assert "api_key_exists" in data
+    assert "question_history" in data
+    assert "model_initialized" in data
+    assert "templates_dir_exists" in data
+    assert "static_dir_exists" in data
+
+
+async def test_root_route_model_unavailable(client, monkeypatch):
+    """Test that the root route reports 503 once model startup has failed"""
+    monkeypatch.setattr(main, "model_checked", True)
+    monkeypatch.setattr(main, "gemini_model", None)
+    
+    response = await client.get("/")
+    assert response.status_code == 503
+    assert response.json()["status"] == "unavailable"
+
+
+@pytest.mark.parametrize("method,endpoint,data,reply,expected_prompt,expected", [
+    ("GET", "/test", None, _RESP_FOUR, "What is 2+2?",
+     {"question": "What is 2+2?", "answer": "4"}),
+    ("POST", "/api/", {"question": "What is the capital of France?"}, _RESP_PARIS,
+     main.build_prompt("What is the capital of France?"), {"answer": "Paris"}),
+], ids=["test", "api"])
+async def test_answer_endpoints(client, model, method, endpoint, data, reply, expected_prompt, expected):
+    """Test the /test and /api/ endpoints answer from the mocked model"""
+    main.answer_cache.clear()
+    model.generate_content.return_value = reply
+    
+    response = await client.request(method, endpoint, data=data)
+    
+    # Check the response
+    assert response.status_code == 200
+    assert response.json() == expected
+    
+    # Verify the model was called once, with exactly the expected prompt
+    model.generate_content.assert_called_once_with(expected_prompt)
+
+
+def test_get_model_backoff(monkeypatch):
+    """Test that get_model skips probing without a key and backs off after a failure"""
+    probe = MagicMock(return_value=None)
+    monkeypatch.setattr(main, "get_cached_model_name", probe)
+    monkeypatch.setattr(main, "gemini_model", None)
+    monkeypatch.setattr(main, "model_retry_at", 0.0)
+    
+    # No API key - nothing is probed
+    monkeypatch.setattr(main, "GEMINI_API_KEY", None)
+    assert get_model() is None
+    probe.assert_not_called()
+    
+    # A failed attempt clears the name cache and starts the backoff
+    monkeypatch.setattr(main, "GEMINI_API_KEY", "test-key")
+    assert get_model() is None
+    assert probe.call_count == 1
+    probe.cache_clear.assert_called_once()
+    assert get_model() is None
+    assert probe.call_count == 1
+    
+    # Callers already waiting on the lock also respect a backoff set meanwhile
+    monkeypatch.setattr(main, "model_retry_at", 0.0)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        with main.model_lock:
+            waiting = [pool.submit(get_model) for _ in range(4)]
+            time.sleep(0.1)
+            main.model_retry_at = time.time() + main.MODEL_RETRY_BACKOFF
+        assert [f.result() for f in waiting] == [None] * 4
+    assert probe.call_count == 1
+    
+    # Once the backoff has elapsed the model is built
+    monkeypatch.setattr(main, "model_retry_at", time.time() - 1)
+    probe.return_value = "models/gemini-1.5-flash"
+    with patch("main.get_genai") as mock_get_genai:
+        assert get_model() is mock_get_genai.return_value.GenerativeModel.return_value
+    assert probe.call_count == 2
+
+
+async def test_test_endpoint_model_failure(client, monkeypatch):
+    """Test the /test endpoint when model initialization fails"""
+    # Swap get_model directly - restored by monkeypatch after the test
+    monkeypatch.setattr(main, "get_model", lambda: None)
+    
+    response = await client.get("/test")
+    data = response.json()
+    
+    # Check error response
+    assert response.status_code == 200
+    assert "error" in data
+    assert data["error"] == "Could not initialize AI model"
+
+
+async def test_api_endpoint_repeated_question_uses_cache(client, model):
+    """Test that a repeated question is answered without calling the model again"""
+    main.answer_cache.clear()
+    model.generate_content.return_value = _RESP_BERLIN
+    
+    for _ in range(2):
+        response = await client.post(
+            "/api/",
+            data={"question": "What is the capital of Germany?"}
+        )
+        assert response.status_code == 200
+        assert response.json()["answer"] == "Berlin"
+    
+    assert model.generate_content.call_count == 1
+
+
+async def test_api_endpoint_repeated_question_skips_embedding(client, model, monkeypatch):
+    """Test that an exact repeat is answered before the semantic tier embeds it"""
+    import numpy as np
+    main.answer_cache.clear()
+    model.generate_content.return_value = _RESP_BERLIN
+    monkeypatch.setattr(main, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(main, "semantic_cache", SemanticCache())
+    
+    with patch("main.embed_question", return_value=np.array([1.0, 0.0], dtype=np.float32)) as mock_embed:
+        for _ in range(2):
+            response = await client.post(
+                "/api/",
+                data={"question": "What is the capital of Germany?"}
+            )
+            assert response.json()["answer"] == "Berlin"
+    
+    mock_embed.assert_called_once_with("What is the capital of Germany?")
+    assert model.generate_content.call_count == 1
+
+
+def test_saved_model_name_skips_probe():
+    """Test that a saved model name is used without probing the API"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_path = os.path.join(temp_dir, "yantravid_gemini_model.txt")
+        with open(cache_path, 'w') as f:
+            f.write("models/gemini-1.5-flash\n")
         
-        # Check the response
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(data["question"], "What is 2+2?")
-        self.assertEqual(data["answer"], "4")
+        main.get_cached_model_name.cache_clear()
+        try:
+            with patch("main.MODEL_NAME_CACHE_PATH", cache_path), \
+                    patch("main.GEMINI_MODEL_NAME", None), \
+                    patch("main.get_genai") as mock_get_genai:
+                assert main.get_cached_model_name() == "models/gemini-1.5-flash"
+                mock_get_genai.assert_not_called()
+        finally:
+            main.get_cached_model_name.cache_clear()
+
+
+def test_unavailable_model_discards_saved_name(model, monkeypatch, tmp_path):
+    """Test that a not-found model error forgets the model and its saved name"""
+    from google.api_core import exceptions as google_exceptions
+    cache_path = tmp_path / "yantravid_gemini_model.txt"
+    cache_path.write_text("models/retired-model")
+    monkeypatch.setattr(main, "MODEL_NAME_CACHE_PATH", str(cache_path))
+    monkeypatch.setattr(main, "gemini_model", model)
+    main.answer_cache.clear()
+    model.generate_content.side_effect = google_exceptions.NotFound("model not found")
+    
+    with patch.object(main.get_cached_model_name, "cache_clear") as mock_cache_clear:
+        with pytest.raises(google_exceptions.NotFound):
+            main.generate_answer(main.build_prompt("What is the capital of Spain?"))
+    
+    assert main.gemini_model is None
+    assert not cache_path.exists()
+    mock_cache_clear.assert_called_once()
+
+
+async def test_concurrent_identical_prompts_share_one_call(model):
+    """Test that identical prompts in flight at the same time call the model once"""
+    main.answer_cache.clear()
+    
+    def slow_generate(prompt):
+        time.sleep(0.1)
+        return _RESP_MADRID
+    
+    model.generate_content.side_effect = slow_generate
+    
+    prompt = main.build_prompt("What is the capital of Spain?")
+    answers = await asyncio.gather(
+        main.generate_answer_once(prompt),
+        main.generate_answer_once(prompt)
+    )
+    
+    assert answers == ["Madrid", "Madrid"]
+    assert model.generate_content.call_count == 1
+    assert main.inflight_answers == {}
+
+
+async def test_api_stream_endpoint(client, model):
+    """Test the streaming API endpoint sends the model output in chunks"""
+    model.generate_content.return_value = iter(_STREAM_CHUNKS)
+    
+    response = await client.post(
+        "/api/stream",
+        data={"question": "What is the capital of Italy?"}
+    )
+    
+    assert response.status_code == 200
+    assert response.text == "Rome"
+    _, kwargs = model.generate_content.call_args
+    assert kwargs["stream"]
+
+
+async def test_api_stream_endpoint_model_failure(client, model):
+    """Test the streaming API endpoint reports failures like /api/"""
+    model.generate_content.side_effect = Exception("Model error")
+
+    response = await client.post(
+        "/api/stream",
+        data={"question": "What is the capital of Spain?"}
+    )
+
+    assert response.status_code == 500
+    assert response.json() == {"error": "Model error"}
+
+    def failing_stream():
+        yield SimpleNamespace(text="Ma")
+        raise Exception("Stream interrupted")
+
+    model.generate_content.side_effect = None
+    model.generate_content.return_value = failing_stream()
+
+    response = await client.post(
+        "/api/stream",
+        data={"question": "What is the capital of Spain?"}
+    )
+
+    assert response.status_code == 200
+    assert response.text == f"Ma{main.STREAM_ERROR_MARKER}Stream interrupted"
+
+
+def test_semantic_cache():
+    """Test semantic cache lookup threshold and oldest-row eviction"""
+    import numpy as np
+    cache = SemanticCache(max_rows=2, threshold=0.9)
+    first = np.array([1.0, 0.0], dtype=np.float32)
+    second = np.array([0.0, 1.0], dtype=np.float32)
+    
+    assert cache.lookup(first) is None
+    cache.add(first, "first")
+    assert cache.lookup(first) == "first"
+    assert cache.lookup(second) is None
+    
+    # A third row evicts the oldest one
+    cache.add(second, "second")
+    cache.add(np.array([0.6, 0.8], dtype=np.float32), "third")
+    assert cache.lookup(first) is None
+    assert cache.lookup(second) == "second"
+
+
+async def test_api_endpoint_with_file(client):
+    """Test the API endpoint with a file upload containing an answer"""
+    response = await client.post(
+        "/api/",
+        data={"question": "What is the answer to life, the universe, and everything?"},
+        files={"file": ("submission.zip", _ZIP_BYTES_RAW, "application/zip")}
+    )
+    
+    # Check the response
+    assert response.status_code == 200
+    assert response.json().get("answer") == "42"
+
+
+def test_read_answer_from_csv():
+    """Test reading the answer column from the first data row only"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_path = os.path.join(temp_dir, "answers.csv")
+        with open(csv_path, 'w', newline='') as csvfile:
+            csvfile.write("id,answer\n1,42\n2,43\n")
+        assert read_answer_from_csv(csv_path) == "42"
         
-        # Verify the model was called correctly
-        mock_model.generate_content.assert_called_once_with("What is 2+2?")
-    
-    def test_test_endpoint_model_failure(self):
-        """Test the /test endpoint when model initialization fails"""
-        # Use a context manager to temporarily modify the get_model function
-        with patch("main.get_model", return_value=None):
-            response = client.get("/test")
-            data = response.json()
-            
-            # Check error response
-            self.assertEqual(response.status_code, 200)
-            self.assertIn("error", data)
-            self.assertEqual(data["error"], "Could not initialize AI model")
-    
-    @patch("main.get_model")
-    def test_api_endpoint_simple_question(self, mock_get_model):
-        """Test the API endpoint with a simple question"""
-        # Create a mock model response
-        mock_model = MagicMock()
-        mock_response = MagicMock()
-        mock_response.text = "Paris"
-        mock_model.generate_content.return_value = mock_response
+        # CSVs without an answer column are skipped
+        with open(csv_path, 'w', newline='') as csvfile:
+            csvfile.write("id,value\n1,42\n")
+        assert read_answer_from_csv(csv_path) is None
+
+
+def test_question_history_is_bounded():
+    """Test that old questions leave both the history and the frequency counter"""
+    with patch("main.question_history", main.deque(maxlen=2)), \
+            patch("main.question_counter", main.Counter()), \
+            patch("main.most_frequent_questions", []):
+        main.record_answer("first", "1", had_file=False)
+        main.record_answer("second", "2", had_file=False)
+        main.record_answer("second", "2", had_file=False)
         
-        # Set up the mock to return our mock model
-        mock_get_model.return_value = mock_model
+        assert len(main.question_history) == 2
+        assert "first" not in main.question_counter
+        assert main.question_counter["second"] == 2
+        assert main.most_frequent_questions == [("second", 2)]
+
+
+async def test_find_answer_in_dir():
+    """Test that nested CSVs are searched and CSVs without answers are skipped"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.makedirs(os.path.join(temp_dir, "a", "b"))
+        with open(os.path.join(temp_dir, "notes.csv"), 'w') as f:
+            f.write("id,value\n1,2\n")
+        with open(os.path.join(temp_dir, "a", "b", "answers.csv"), 'w') as f:
+            f.write("answer\n7\n")
         
-        # Test the API endpoint
-        response = client.post(
-            "/api/",
-            data={"question": "What is the capital of France?"}
+        assert await main.find_answer_in_dir(temp_dir) == "7"
+
+
+async def test_api_endpoint_repeated_zip_skips_extraction(client):
+    """Test that an identical ZIP upload is answered from the digest cache"""
+    zip_bytes = io.BytesIO()
+    with zipfile.ZipFile(zip_bytes, 'w') as zipf:
+        zipf.writestr(
+            zipfile.ZipInfo("answers.csv"),
+            b"answer,other_column\n1234,cached\n",
+            compress_type=zipfile.ZIP_STORED
         )
-        
-        # Check response
-        self.assertEqual(response.status_code, 200)
-        data = response.json()
-        self.assertEqual(data["answer"], "Paris")
-        
-        # Check that the model was called with the right prompt
-        args, _ = mock_model.generate_content.call_args
-        prompt = args[0]
-        self.assertIn("What is the capital of France?", prompt)
-    
-    def test_api_endpoint_with_file(self):
-        """Test the API endpoint with a file upload containing an answer"""
-        # Create a temporary CSV file with an answer
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Create a CSV file with an 'answer' column
-            csv_path = os.path.join(temp_dir, "answers.csv")
-            with open(csv_path, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(['answer', 'other_column'])
-                writer.writerow(['42', 'some data'])
-            
-            # Create a ZIP file containing the CSV
-            zip_path = os.path.join(temp_dir, "submission.zip")
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                zipf.write(csv_path, arcname="answers.csv")
-            
-            # Open the file for the request
-            with open(zip_path, 'rb') as f:
-                # Test the API endpoint
-                response = client.post(
-                    "/api/",
-                    data={"question": "What is the answer to life, the universe, and everything?"},
-                    files={"file": ("submission.zip", f, "application/zip")}
-                )
-            
-            # Check the response
-            if response.status_code == 200:
-                data = response.json()
-                # Note: This might fail if file processing is disabled
-                # In that case, adjust the expected output
-                self.assertEqual(data.get("answer"), "42")
-    
-    def test_dashboard_route(self):
-        """Test the dashboard route returns a 200 response"""
-        response = client.get("/dashboard")
-        self.assertEqual(response.status_code, 200)
+    zip_raw = zip_bytes.getvalue()
+    
+    with patch("main.find_answer_in_dir", wraps=main.find_answer_in_dir) as mock_find:
+        for _ in range(2):
+            response = await client.post(
+                "/api/",
+                data={"question": "Which number is in the CSV?"},
+                files={"file": ("repeat.zip", zip_raw, "application/zip")}
+            )
+            assert response.status_code == 200
+            assert response.json()["answer"] == "1234"
+    
+    assert mock_find.call_count == 1
 
-if __name__ == "__main__":
-    # Create the templates and static directories if they don't exist
-    templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
-    static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
-    os.makedirs(templates_dir, exist_ok=True)
-    os.makedirs(static_dir, exist_ok=True)
-    
-    # Ensure a basic dashboard.html exists
-    if not os.path.exists(os.path.join(templates_dir, "dashboard.html")):
-        with open(os.path.join(templates_dir, "dashboard.html"), 'w') as f:
-            f.write("""<!DOCTYPE html>
-            <html>
-            <head><title>Dashboard</title></head>
-            <body>
-                <h1>Dashboard</h1>
-                <ul>
-                {% for item in recent_questions %}
-                    <li>{{ item.question }} - {{ item.answer }}</li>
-                {% endfor %}
-                </ul>
-            </body>
-            </html>""")
+
+async def test_dashboard_etag(client, dashboard_template):
+    """Test that an unchanged dashboard answers conditional requests with 304"""
+    etag = (await client.get("/dashboard")).headers["etag"]
+    response = await client.get("/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 304
     
+    # Recording an answer changes the ETag
+    main.record_answer("What is 1+1?", "2", had_file=False)
+    response = await client.get("/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "What is 1+1?" in response.text
+
+
+if __name__ == "__main__":
     # Run the tests
-    unittest.main()
\ No newline at end of file
+    sys.exit(pytest.main([__file__]))